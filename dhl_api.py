@@ -1,10 +1,71 @@
-import requests
-import json
-import time
+import asyncio
+import httpx
+import logging
+import orjson
 import os
 import pandas as pd
+from rate_limiter import AsyncRateLimiter
+from results_writer import track_to_parquet
+from retry import MAX_ATTEMPTS, RETRY_STATUSES, retry_delay
+from ttl_cache import TTLCache
 
-def get_dhl_status(tracking_number):
+logger = logging.getLogger(__name__)
+
+# Maximum number of DHL requests allowed in flight at the same time.
+MAX_CONCURRENT_REQUESTS = 5
+
+# Ensure you have set your DHL API key in environment variables; fail at import
+# rather than sending unauthenticated requests.
+DHL_API_KEY = os.environ.get("DHL_API_KEY")
+if not DHL_API_KEY:
+    raise RuntimeError("Set DHL_API_KEY in the environment before importing dhl_api.")
+
+# Endpoint, headers and timeout shared by every DHL tracking request.
+DHL_API_URL = "https://api-test.dhl.com/track/shipments"
+_DHL_HEADERS = {'DHL-API-Key': DHL_API_KEY}
+_TIMEOUT = httpx.Timeout(10)
+
+# Maximum sustained number of DHL tracking requests per second, without bursts:
+# one call every 5 seconds keeps within the test API key's rate limit. The rate
+# is lowered further while the API responds with 429 or 5xx errors.
+REQUESTS_PER_SECOND = 0.2
+_RATE_LIMITER = AsyncRateLimiter(REQUESTS_PER_SECOND, capacity=1)
+
+# Recently retrieved statuses, reused for repeated tracking numbers within and
+# across batches for STATUS_CACHE_TTL seconds.
+STATUS_CACHE_TTL = 300
+_STATUS_CACHE = TTLCache(maxsize=10_000, ttl=STATUS_CACHE_TTL)
+
+# Parquet file main() writes the results to.
+RESULTS_PATH = "dhl_results.parquet"
+
+# Shared HTTP/2 client, reused across calls so concurrent requests to the
+# DHL endpoints are multiplexed over one kept-alive TCP+TLS connection per host.
+_CLIENT = None
+
+def _get_client():
+    """
+    Returns the module-wide httpx client, creating it on first use.
+
+    Returns:
+        httpx.AsyncClient: The shared HTTP client.
+    """
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        limits = httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=75)
+        _CLIENT = httpx.AsyncClient(http2=True, limits=limits, timeout=_TIMEOUT)
+    return _CLIENT
+
+async def close_client():
+    """
+    Closes the module-wide httpx client if it is open.
+    """
+    global _CLIENT
+    if _CLIENT is not None and not _CLIENT.is_closed:
+        await _CLIENT.aclose()
+    _CLIENT = None
+
+async def get_dhl_status(tracking_number):
     """
     Retrieves the status of a single tracking number via a DHL API.
 
@@ -16,56 +77,92 @@ def get_dhl_status(tracking_number):
         otherwise None.
     """
 
-    api_url = f"https://api-test.dhl.com/track/shipments?trackingNumber={tracking_number}"
-
-    headers = {'DHL-API-Key': os.environ.get("DHL_API_KEY")}
+    cached = _STATUS_CACHE.get(tracking_number)
+    if cached is not None:
+        logger.debug("Using cached status for tracking number: %s", tracking_number)
+        return cached
 
-    print(f"Attempting to retrieve status for tracking number: {tracking_number}...")
+    logger.debug("Attempting to retrieve status for tracking number: %s", tracking_number)
 
     try:
-        # Make the GET request to the API endpoint.
-        response = requests.get(api_url, headers=headers, timeout=10)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            # Wait for the rate limiter, then make the GET request to the API endpoint.
+            await _RATE_LIMITER.acquire()
+            response = await _get_client().get(DHL_API_URL, params={"trackingNumber": tracking_number},
+                                               headers=_DHL_HEADERS)
+
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                # Handle API errors, slowing down if the API is overloaded.
+                status_code = e.response.status_code
+                if status_code == 429 or status_code >= 500:
+                    _RATE_LIMITER.backoff()
+                if status_code not in RETRY_STATUSES or attempt == MAX_ATTEMPTS:
+                    logger.warning("Error retrieving status for %s. Status code: %s. Error response: %r",
+                                   tracking_number, status_code, response.content[:200])
+                    return None
+
+                # Transient failure: back off before the next attempt.
+                delay = retry_delay(attempt, response.headers.get("Retry-After"))
+                logger.info("Status code %s for %s, retrying in %.1f seconds.", status_code, tracking_number, delay)
+                await asyncio.sleep(delay)
+                continue
 
-        # Check if the request was successful (HTTP status code 200).
-        if response.status_code == 200:
-            tracking_data = response.json()
-            print(f"Successfully retrieved status for {tracking_number}.")
+            _RATE_LIMITER.recover()
+            tracking_data = orjson.loads(response.content)
+            logger.debug("Successfully retrieved status for %s.", tracking_number)
+            _STATUS_CACHE[tracking_number] = tracking_data
             return tracking_data
-        else:
-            # Handle API errors.
-            print(f"Error retrieving status for {tracking_number}. Status code: {response.status_code}")
-            print(f"Error response: {response.text}")
-            return None
 
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         # Handle network or other request-related errors.
-        print(f"A request error occurred for {tracking_number}: {e}")
+        logger.warning("A request error occurred for %s: %s", tracking_number, e)
         return None
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         # Handle cases where the response is not valid JSON.
-        print(f"Failed to decode JSON from the response for {tracking_number}.")
+        logger.warning("Failed to decode JSON from the response for %s.", tracking_number)
         return None
 
-def main():
+async def track_shipments(tracking_ids):
     """
-    Main function to process a list of tracking numbers from a "document"
-    and check their status.
+    Retrieves the status of several tracking numbers concurrently via the DHL API
+    and extracts the fields of interest.
+
+    Uses the module-wide client; call close_client() once all lookups are done.
+
+    Args:
+        tracking_ids (list[str]): The tracking numbers to retrieve.
+
+    Returns:
+        pandas.DataFrame: One row per tracking number whose status could be retrieved.
     """
-    # --- Simulating a document with tracking information ---
-    # In a real-world scenario, you would read this data from a file (CSV, Excel),
-    # a database, or another source.
-    tracking_documents = [
-        {"tracking_id": "8917799995"},
-        {"tracking_id": "8162797823"},
-    ]
+    # Extracted info for the DataFrame, stored column by column
+    results = {
+        "tracking_id": [],
+        #"status_description": [],
+        "shipper_countryCode": [],
+        #"consignee_countryCode": [],
+    }
+
+    # Cap the number of requests in flight to avoid hitting rate limits.
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def fetch(tracking_id):
+        async with semaphore:
+            return await get_dhl_status(tracking_id)
 
-    results = []  # To store extracted info for DataFrame
+    # Look up every tracking number only once, even if it is listed several times.
+    tracking_ids = list(dict.fromkeys(tracking_ids))
 
-    # Iterate through each tracking document and call the get status function.
-    for doc in tracking_documents:
-        tracking_id = doc["tracking_id"]
-        status_data = get_dhl_status(tracking_id)
-        if status_data:
+    # Fetch the status of every tracking number concurrently over the shared client.
+    tasks = [fetch(tracking_id) for tracking_id in tracking_ids]
+    responses = await asyncio.gather(*tasks, return_exceptions=True)
+
+    for tracking_id, status_data in zip(tracking_ids, responses):
+        if isinstance(status_data, Exception):
+            logger.error("Unexpected error retrieving status for %s: %s", tracking_id, status_data)
+        elif status_data:
             # Extract required fields from the DHL API response
             try:
                 shipment = status_data["shipments"][0]
@@ -73,23 +170,44 @@ def main():
                 #shipper_cc = shipment["details"]["shipper"]["address"].get("countryCode", None)
                 shipper_cc = shipment["origin"]["address"].get("countryCode", None)
                 #consignee_cc = shipment["details"]['consignee']["address"].get("countryCode", None)
-                results.append({
-                    "tracking_id": tracking_id,
-                    #"status_description": status_desc,
-                    "shipper_countryCode": shipper_cc,
-                    #"consignee_countryCode": consignee_cc
-                })
+                results["tracking_id"].append(tracking_id)
+                #results["status_description"].append(status_desc)
+                results["shipper_countryCode"].append(shipper_cc)
+                #results["consignee_countryCode"].append(consignee_cc)
             except (KeyError, IndexError, TypeError) as e:
-                print(f"Error extracting fields for {tracking_id}: {e}")
+                logger.warning("Error extracting fields for %s: %s", tracking_id, e)
+
+    # Create DataFrame
+    df = pd.DataFrame(results, copy=False)
+    # Country codes come from a small fixed set, so store them as categories.
+    df = df.astype({"shipper_countryCode": "category"})
+    return df
+
+async def main():
+    """
+    Main function to process a list of tracking numbers from a "document"
+    and check their status.
+    """
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
 
-        # Add a small delay between API calls to avoid hitting rate limits.
-        time.sleep(5) # Adjusted to 5 seconds for better rate limiting
-        print("-" * 30)
+    # --- Simulating a document with tracking information ---
+    # In a real-world scenario, you would read this data from a file (CSV, Excel),
+    # a database, or another source.
+    tracking_documents = [
+        {"tracking_id": "8917799995"},
+        {"tracking_id": "8162797823"},
+    ]
+
+    # Track the shipments in batches, appending each batch's results to disk.
+    try:
+        await track_to_parquet(RESULTS_PATH, [doc["tracking_id"] for doc in tracking_documents],
+                               track_shipments)
+    finally:
+        await close_client()
 
-    # Create DataFrame and print
-    df = pd.DataFrame(results)
+    df = pd.read_parquet(RESULTS_PATH)
     print("\nSummary DataFrame:")
     print(df)
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
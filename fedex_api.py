@@ -1,12 +1,170 @@
-import requests
+import asyncio
+import functools
+import httpx
+import itertools
+import jmespath
+import logging
 import os
-import json
-import pandas as pd
+import orjson
 import time
+import urllib.parse
+import pandas as pd
+from rate_limiter import AsyncRateLimiter
+from results_writer import track_to_parquet
+from retry import MAX_ATTEMPTS, RETRY_STATUSES, retry_delay
+from ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of FedEx requests allowed in flight at the same time.
+MAX_CONCURRENT_REQUESTS = 5
+
+# Ensure you have set your FedEx API credentials in environment variables; fail
+# at import rather than on every lookup.
+FEDEX_CLIENT_ID = os.environ.get("FEDEX_CLIENT_ID")
+FEDEX_CLIENT_SECRET = os.environ.get("FEDEX_CLIENT_SECRET")
+if not FEDEX_CLIENT_ID or not FEDEX_CLIENT_SECRET:
+    raise RuntimeError("Set FEDEX_CLIENT_ID and FEDEX_CLIENT_SECRET in the environment before importing fedex_api.")
+
+# Endpoint, headers and timeout shared by every FedEx track request; only the
+# Authorization header and the tracking numbers vary between calls.
+FEDEX_TRACK_URL = "https://apis-sandbox.fedex.com/track/v1/trackingnumbers"
+_TRACK_HEADERS = {
+    'Content-Type': "application/json",
+    'X-locale': "en_US",
+}
+_TIMEOUT = httpx.Timeout(10)
+
+# Maximum sustained number of FedEx tracking requests per second; the rate is
+# lowered automatically while the API responds with 429 or 5xx errors.
+REQUESTS_PER_SECOND = 1
+_RATE_LIMITER = AsyncRateLimiter(REQUESTS_PER_SECOND, capacity=MAX_CONCURRENT_REQUESTS)
+
+# Maximum number of tracking numbers FedEx accepts in a single track request.
+MAX_TRACKING_NUMBERS_PER_REQUEST = 30
+
+# Recently retrieved track results, reused for repeated tracking numbers within and
+# across batches for STATUS_CACHE_TTL seconds.
+STATUS_CACHE_TTL = 300
+_STATUS_CACHE = TTLCache(maxsize=10_000, ttl=STATUS_CACHE_TTL)
+
+# Parquet file main() writes the results to.
+RESULTS_PATH = "fedex_results.parquet"
+
+# Precompiled path to the per-shipment results of a track response; evaluates to None when missing.
+_COMPLETE_TRACK_RESULTS = jmespath.compile("output.completeTrackResults")
+
+# Flattened track result fields to extract, and the result columns they map to.
+# The FedEx API response structure may vary; adjust as needed
+_RESULT_COLUMNS = {
+    "latestStatusDetail.description": "status_description",
+    "shipperInformation.address.countryCode": "shipper_countryCode",
+    "recipientInformation.address.countryCode": "consignee_countryCode",
+}
+
+# Access tokens cached per (client_id, sandbox) as (token, monotonic expiry time).
+_TOKEN_CACHE = {}
+# Lock serializing token refreshes, created per event loop by _get_token_lock().
+_TOKEN_LOCK = None
+_TOKEN_LOCK_LOOP = None
+# Refresh a cached token this many seconds before it actually expires.
+TOKEN_EXPIRY_MARGIN = 60
+
+# Headers for the OAuth request
+# Content-Type must be 'application/x-www-form-urlencoded'
+_TOKEN_HEADERS = {
+    "Content-Type": "application/x-www-form-urlencoded"
+}
+
+# Shared HTTP/2 client, reused across calls so concurrent requests to the
+# FedEx endpoints are multiplexed over one kept-alive TCP+TLS connection per host.
+_CLIENT = None
+
+def _get_client():
+    """
+    Returns the module-wide httpx client, creating it on first use.
+
+    Returns:
+        httpx.AsyncClient: The shared HTTP client.
+    """
+    global _CLIENT
+    if _CLIENT is None or _CLIENT.is_closed:
+        limits = httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=75)
+        _CLIENT = httpx.AsyncClient(http2=True, limits=limits, timeout=_TIMEOUT)
+    return _CLIENT
+
+async def close_client():
+    """
+    Closes the module-wide httpx client if it is open.
+    """
+    global _CLIENT
+    if _CLIENT is not None and not _CLIENT.is_closed:
+        await _CLIENT.aclose()
+    _CLIENT = None
+
+@functools.lru_cache(maxsize=None)
+def _token_body(client_id, client_secret):
+    """
+    Returns the URL-encoded body of the OAuth request, built once per set of credentials.
+
+    Args:
+        client_id (str): Your FedEx API Client ID (also known as API Key).
+        client_secret (str): Your FedEx API Client Secret (also known as Secret Key).
+
+    Returns:
+        bytes: The encoded form payload.
+    """
+    # grant_type must be 'client_credentials' for this flow
+    payload = {
+        "grant_type": "client_credentials",
+        "client_id": client_id,
+        "client_secret": client_secret
+    }
+    return urllib.parse.urlencode(payload).encode()
+
+def _get_token_lock():
+    """
+    Returns the token refresh lock for the running event loop, creating it on first use.
+
+    An asyncio.Lock binds to the loop it is first used in, so a module-wide lock
+    would break lookups in any later asyncio.run() call.
+
+    Returns:
+        asyncio.Lock: The token refresh lock.
+    """
+    global _TOKEN_LOCK, _TOKEN_LOCK_LOOP
+    loop = asyncio.get_running_loop()
+    if _TOKEN_LOCK_LOOP is not loop:
+        _TOKEN_LOCK = asyncio.Lock()
+        _TOKEN_LOCK_LOOP = loop
+    return _TOKEN_LOCK
+
+async def get_fedex_access_token(client_id, client_secret, sandbox=True):
+    """
+    Returns a FedEx OAuth 2.0 access token, reusing a cached one until shortly
+    before it expires.
+
+    Args:
+        client_id (str): Your FedEx API Client ID (also known as API Key).
+        client_secret (str): Your FedEx API Client Secret (also known as Secret Key).
+        sandbox (bool): If True, uses the sandbox environment URL. If False, uses production.
+
+    Returns:
+        str: The access token if successful, None otherwise.
+    """
+    key = (client_id, sandbox)
+    # Hold the lock while refreshing so concurrent lookups wait for a single
+    # token request instead of each issuing their own.
+    async with _get_token_lock():
+        cached = _TOKEN_CACHE.get(key)
+        if cached and time.monotonic() < cached[1] - TOKEN_EXPIRY_MARGIN:
+            return cached[0]
+        return await _request_fedex_access_token(client_id, client_secret, sandbox)
+
 
-def get_fedex_access_token(client_id, client_secret, sandbox=True):
+async def _request_fedex_access_token(client_id, client_secret, sandbox=True):
     """
-    Obtains an OAuth 2.0 access token from the FedEx API.
+    Obtains a new OAuth 2.0 access token from the FedEx API and caches it.
 
     Args:
         client_id (str): Your FedEx API Client ID (also known as API Key).
@@ -24,61 +182,48 @@ def get_fedex_access_token(client_id, client_secret, sandbox=True):
         # Ensure you have a live FedEx shipping account and production keys for this.
         token_url = "https://apis.fedex.com/oauth/token"
 
-    # The payload for the OAuth request
-    # grant_type must be 'client_credentials' for this flow
-    payload = {
-        "grant_type": "client_credentials",
-        "client_id": client_id,
-        "client_secret": client_secret
-    }
-
-    # Headers for the OAuth request
-    # Content-Type must be 'application/x-www-form-urlencoded'
-    headers = {
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-
-    print(f"Attempting to get access token from: {token_url}")
+    logger.debug("Attempting to get access token from: %s", token_url)
     try:
         # Make the POST request to the OAuth token endpoint
-        response = requests.post(token_url, data=payload, headers=headers)
-        response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
+        response = await _get_client().post(token_url, content=_token_body(client_id, client_secret),
+                                            headers=_TOKEN_HEADERS)
+        response.raise_for_status()  # Raise an HTTPStatusError for bad responses (4xx or 5xx)
 
         # Parse the JSON response
-        token_data = response.json()
+        raw = response.content
+        token_data = orjson.loads(raw)
 
         # Extract the access token
         access_token = token_data.get("access_token")
         expires_in = token_data.get("expires_in") # Token expiration in seconds
 
         if access_token:
-            print(f"Successfully obtained access token. Expires in {expires_in} seconds.")
+            logger.debug("Successfully obtained access token. Expires in %s seconds.", expires_in)
+            _TOKEN_CACHE[(client_id, sandbox)] = (access_token, time.monotonic() + float(expires_in or 0))
             return access_token
         else:
-            print("Error: Access token not found in response.")
-            print(f"Full response: {token_data}")
+            logger.error("Access token not found in response. Full response: %s", token_data)
             return None
 
-    except requests.exceptions.HTTPError as http_err:
-        print(f"HTTP error occurred: {http_err}")
-        print(f"Response content: {response.text}")
+    except httpx.HTTPStatusError as http_err:
+        logger.error("HTTP error occurred: %s %s. Response content: %r",
+                     http_err.response.status_code, http_err.response.reason_phrase, response.content[:200])
         return None
-    except requests.exceptions.ConnectionError as conn_err:
-        print(f"Connection error occurred: {conn_err}")
+    except httpx.ConnectError as conn_err:
+        logger.error("Connection error occurred: %s", conn_err)
         return None
-    except requests.exceptions.Timeout as timeout_err:
-        print(f"Timeout error occurred: {timeout_err}")
+    except httpx.TimeoutException as timeout_err:
+        logger.error("Timeout error occurred: %s", timeout_err)
         return None
-    except requests.exceptions.RequestException as req_err:
-        print(f"An unexpected error occurred: {req_err}")
+    except httpx.HTTPError as req_err:
+        logger.error("An unexpected error occurred: %s", req_err)
         return None
-    except json.JSONDecodeError as json_err:
-        print(f"Error decoding JSON response: {json_err}")
-        print(f"Raw response text: {response.text}")
+    except orjson.JSONDecodeError as json_err:
+        logger.error("Error decoding JSON response: %s. Raw response text: %r", json_err, raw[:200])
         return None
 
 
-def get_fedex_status(tracking_number):
+async def get_fedex_status(tracking_number):
     """
     Retrieves the status of a single tracking number via a FedEx API.
 
@@ -89,23 +234,28 @@ def get_fedex_status(tracking_number):
         dict or None: A dictionary containing the tracking status data if successful,
         otherwise None.
     """
+    return await get_fedex_status_batch([tracking_number])
 
-    # Ensure you have set your FedEx API credentials in environment variables
-    client_id = os.environ.get("FEDEX_CLIENT_ID")
-    client_secret = os.environ.get("FEDEX_CLIENT_SECRET")
 
-    if not client_id or not client_secret:
-        print("Error: FedEx API credentials are not set in environment variables.")
-        return None
+async def get_fedex_status_batch(tracking_numbers):
+    """
+    Retrieves the status of several tracking numbers with a single FedEx API request.
 
-    access_token = get_fedex_access_token(client_id, client_secret, sandbox=True)
+    Args:
+        tracking_numbers (list[str]): The tracking numbers to retrieve, at most
+            MAX_TRACKING_NUMBERS_PER_REQUEST of them.
+
+    Returns:
+        dict or None: A dictionary containing the tracking status data for every
+        tracking number if successful, otherwise None.
+    """
+    access_token = await get_fedex_access_token(FEDEX_CLIENT_ID, FEDEX_CLIENT_SECRET, sandbox=True)
 
     if not access_token:
-        print("Failed to obtain access token.")
+        logger.error("Failed to obtain access token.")
         return None
 
     # Prepare the API request
-    url = "https://apis-sandbox.fedex.com/track/v1/trackingnumbers"
     input = {
             "trackingInfo": [
                 {
@@ -113,45 +263,162 @@ def get_fedex_status(tracking_number):
                     "trackingNumber": tracking_number
                     }
                 }
+                for tracking_number in tracking_numbers
             ],
             "includeDetailedScans": True
         }
 
     payload = input # 'input' refers to JSON Payload
-    headers = {
-        'Content-Type': "application/json",
-        'X-locale': "en_US",
-        'Authorization': f"Bearer {access_token}"
-    }
+    # Serialize once up front; the same bytes are re-sent on every retry.
+    body = orjson.dumps(payload)
+    headers = {**_TRACK_HEADERS, 'Authorization': f"Bearer {access_token}"}
 
     try:
-        response = requests.post(url, json=payload, headers=headers)
-        # Check if the request was successful (HTTP status code 200).
-        if response.status_code == 200:
-            tracking_data = response.json()
-            print(f"Successfully retrieved status for {tracking_number}.")
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            await _RATE_LIMITER.acquire()
+            response = await _get_client().post(FEDEX_TRACK_URL, content=body, headers=headers)
+            try:
+                response.raise_for_status()
+            except httpx.HTTPStatusError as e:
+                # Handle API errors, slowing down if the API is overloaded.
+                status_code = e.response.status_code
+                if status_code == 429 or status_code >= 500:
+                    _RATE_LIMITER.backoff()
+                if status_code not in RETRY_STATUSES or attempt == MAX_ATTEMPTS:
+                    logger.warning("Error retrieving status for %s. Status code: %s. Error response: %r",
+                                   tracking_numbers, status_code, response.content[:200])
+                    return None
+
+                # Transient failure: back off before the next attempt.
+                delay = retry_delay(attempt, response.headers.get("Retry-After"))
+                logger.info("Status code %s for %s, retrying in %.1f seconds.", status_code, tracking_numbers, delay)
+                await asyncio.sleep(delay)
+                continue
+
+            _RATE_LIMITER.recover()
+            tracking_data = orjson.loads(response.content)
+            logger.debug("Successfully retrieved status for %s.", tracking_numbers)
             # Return the tracking data
             return tracking_data
-        else:
-            # Handle API errors.
-            print(f"Error retrieving status for {tracking_number}. Status code: {response.status_code}")
-            print(f"Error response: {response.text}")
-            return None
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         # Handle network or other request-related errors.
-        print(f"A request error occurred for {tracking_number}: {e}")
+        logger.warning("A request error occurred for %s: %s", tracking_numbers, e)
         return None
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         # Handle cases where the response is not valid JSON.
-        print(f"Failed to decode JSON from the response for {tracking_number}.")
+        logger.warning("Failed to decode JSON from the response for %s.", tracking_numbers)
         return None
 
 
-def main():
+def _is_successful_result(shipment):
+    """
+    Checks whether a completeTrackResults entry holds a track result rather than an error.
+
+    Args:
+        shipment (dict): One entry of the response's completeTrackResults.
+
+    Returns:
+        bool: True if the entry's first track result exists and has no "error" key.
+    """
+    track_results = shipment.get("trackResults")
+    return (isinstance(track_results, list) and bool(track_results)
+            and isinstance(track_results[0], dict) and "error" not in track_results[0])
+
+
+async def track_shipments(tracking_ids):
+    """
+    Retrieves the status of several tracking numbers concurrently via the FedEx API
+    and extracts the fields of interest.
+
+    Uses the module-wide client; call close_client() once all lookups are done.
+
+    Args:
+        tracking_ids (list[str]): The tracking numbers to retrieve.
+
+    Returns:
+        pandas.DataFrame: One row per tracking number whose status could be retrieved.
+    """
+    # Cap the number of requests in flight to avoid hitting rate limits.
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def fetch(batch):
+        async with semaphore:
+            return await get_fedex_status_batch(batch)
+
+    # Look up every tracking number only once, even if it is listed several times,
+    # and reuse the track results retrieved recently.
+    tracking_ids = list(dict.fromkeys(tracking_ids))
+    track_results = {}
+    for tracking_id in tracking_ids:
+        cached = _STATUS_CACHE.get(tracking_id)
+        if cached is not None:
+            track_results[tracking_id] = cached
+
+    # Group the remaining tracking numbers so each request covers as many as FedEx allows.
+    pending = iter([tracking_id for tracking_id in tracking_ids if tracking_id not in track_results])
+    batches = []
+    while batch := list(itertools.islice(pending, MAX_TRACKING_NUMBERS_PER_REQUEST)):
+        batches.append(batch)
+
+    # Fetch every batch concurrently over the shared client.
+    tasks = [fetch(batch) for batch in batches]
+    responses = await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Index the results of every batch by their tracking number.
+    for batch, status_data in zip(batches, responses):
+        if isinstance(status_data, Exception):
+            logger.error("Unexpected error retrieving status for %s: %s", batch, status_data)
+        elif status_data:
+            complete_results = _COMPLETE_TRACK_RESULTS.search(status_data)
+            if complete_results is None:
+                continue
+            if not isinstance(complete_results, list):
+                logger.warning("Unexpected completeTrackResults for %s: %r", batch, complete_results)
+                continue
+            for shipment in complete_results:
+                if not isinstance(shipment, dict):
+                    logger.warning("Skipping malformed track result for %s: %r", batch, shipment)
+                    continue
+                tracking_number = shipment.get("trackingNumber")
+                track_results[tracking_number] = shipment
+                # Only cache successful lookups; per-shipment errors such as NOTFOUND
+                # for a label created moments ago may resolve on the next run.
+                if tracking_number is not None and _is_successful_result(shipment):
+                    _STATUS_CACHE[tracking_number] = shipment
+
+    # Collect the raw track result of every shipment found.
+    found_ids = []
+    raw_results = []
+    for tracking_id in tracking_ids:
+        shipment = track_results.get(tracking_id)
+        if shipment:
+            try:
+                track_result = (shipment.get("trackResults") or [{}])[0]
+                if not isinstance(track_result, dict):
+                    raise TypeError(f"track result is a {type(track_result).__name__}, not a dict")
+            except (KeyError, IndexError, TypeError) as e:
+                logger.warning("Error extracting fields for %s: %s", tracking_id, e)
+                continue
+            found_ids.append(tracking_id)
+            raw_results.append(track_result)
+
+    # Create DataFrame, extracting the fields of all track results in one pass;
+    # fields missing from a track result come out as NaN.
+    df = pd.json_normalize(raw_results, max_level=3)
+    df = df.reindex(columns=list(_RESULT_COLUMNS)).rename(columns=_RESULT_COLUMNS)
+    df.insert(0, "tracking_id", found_ids)
+    # Country codes come from a small fixed set, so store them as categories.
+    df = df.astype({"shipper_countryCode": "category", "consignee_countryCode": "category"})
+    return df
+
+
+async def main():
     """
     Main function to process a list of tracking numbers from a "document"
     and check their status.
     """
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
+
     # --- Simulating a document with tracking information ---
     # In a real-world scenario, you would read this data from a file (CSV, Excel),
     # a database, or another source.
@@ -160,35 +427,16 @@ def main():
         {"tracking_id": "020207021381215"},
     ]
 
-    results = []  # To store extracted info for DataFrame
-
-    # Iterate through each tracking document and call the get status function.
-    for doc in tracking_documents:
-        tracking_id = doc["tracking_id"]
-        status_data = get_fedex_status(tracking_id)
-        if status_data:
-            try:
-                # The FedEx API response structure may vary; adjust as needed
-                shipment = status_data.get("output", {}).get("completeTrackResults", [{}])[0]
-                track_result = shipment.get("trackResults", [{}])[0]
-                status_desc = track_result.get("latestStatusDetail", {}).get("description", None)
-                shipper_cc = track_result.get("shipperInformation", {}).get("address",{}).get("countryCode", None)
-                consignee_cc = track_result.get("recipientInformation", {}).get("address",{}).get("countryCode", None)
-                results.append({
-                    "tracking_id": tracking_id,
-                    "status_description": status_desc,
-                    "shipper_countryCode": shipper_cc,
-                    "consignee_countryCode": consignee_cc
-                })
-            except (KeyError, IndexError, TypeError) as e:
-                print(f"Error extracting fields for {tracking_id}: {e}")
-        time.sleep(5)
-        print("-" * 30)
+    # Track the shipments in batches, appending each batch's results to disk.
+    try:
+        await track_to_parquet(RESULTS_PATH, [doc["tracking_id"] for doc in tracking_documents],
+                               track_shipments)
+    finally:
+        await close_client()
 
-    # Create DataFrame and print
-    df = pd.DataFrame(results)
+    df = pd.read_parquet(RESULTS_PATH)
     print("\nSummary DataFrame:")
     print(df)
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+class AsyncRateLimiter:
+    """
+    Token-bucket rate limiter for coroutines.
+
+    Requests are allowed at up to `rate` per second, with bursts of up to
+    `capacity` requests. A caller only waits when the bucket is empty, and only
+    for as long as it takes the next token to become available.
+
+    The rate adapts to the API's responses: it is halved whenever the API
+    signals that it is overloaded (see `backoff`) and grows back towards the
+    configured maximum as requests succeed again (see `recover`).
+    """
+
+    def __init__(self, rate, capacity=None, min_rate=None):
+        """
+        Args:
+            rate (float): The maximum number of requests allowed per second.
+            capacity (float): The maximum burst size. Defaults to `rate`, but at least 1.
+            min_rate (float): The lowest rate `backoff` may reduce to. Defaults to a tenth of `rate`.
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min_rate if min_rate is not None else rate / 10
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.last = time.monotonic()
+        # asyncio.Lock binds to the event loop it is first used in, so one is
+        # created per loop, letting the limiter be reused across asyncio.run() calls.
+        self._lock = None
+        self._loop = None
+
+    def _get_lock(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._lock = asyncio.Lock()
+            self._loop = loop
+        return self._lock
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+
+    async def acquire(self):
+        """
+        Waits until a request may be sent and consumes one token.
+        """
+        async with self._get_lock():
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+    def backoff(self):
+        """
+        Halves the request rate after the API signalled it is overloaded (HTTP 429 or 5xx).
+        """
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def recover(self):
+        """
+        Raises the request rate by a tenth of its maximum after a successful request.
+        """
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
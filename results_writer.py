@@ -0,0 +1,51 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Columns written for every tracked shipment. Country codes come from a small
+# fixed set, so they are dictionary-encoded on disk.
+RESULTS_SCHEMA = pa.schema([
+    ("tracking_id", pa.string()),
+    ("status_description", pa.string()),
+    ("shipper_countryCode", pa.dictionary(pa.int16(), pa.string())),
+    ("consignee_countryCode", pa.dictionary(pa.int16(), pa.string())),
+])
+
+# Number of items tracked and written to disk at a time.
+WRITE_BATCH_SIZE = 1000
+
+def _to_table(df, schema):
+    """
+    Converts a results DataFrame to a table with the given schema, filling
+    columns the DataFrame does not have with nulls.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for field in schema:
+        if field.name not in table.column_names:
+            table = table.append_column(field.name, pa.nulls(len(table), field.type))
+    return table.select(schema.names).cast(schema)
+
+async def track_to_parquet(path, items, track, schema=RESULTS_SCHEMA, batch_size=WRITE_BATCH_SIZE):
+    """
+    Tracks items in batches and appends the results of each batch to a Parquet file.
+
+    Only one batch of results is held in memory at a time, and the batches
+    completed before a crash are already on disk.
+
+    Args:
+        path (str): The Parquet file to write.
+        items (list): The items to track, e.g. tracking numbers.
+        track (callable): Coroutine function taking a list of items and returning
+            a DataFrame of results.
+        schema (pyarrow.Schema): The schema of the Parquet file.
+        batch_size (int): The number of items to track per batch.
+
+    Returns:
+        int: The number of rows written.
+    """
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for start in range(0, len(items), batch_size):
+            df = await track(items[start:start + batch_size])
+            writer.write_table(_to_table(df, schema))
+            rows += len(df)
+    return rows
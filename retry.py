@@ -0,0 +1,43 @@
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+# HTTP status codes that indicate a transient failure worth retrying.
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Maximum number of attempts per request, including the first one.
+MAX_ATTEMPTS = 5
+
+# Base delay in seconds; attempt n waits up to BACKOFF_FACTOR * 2 ** (n - 1).
+BACKOFF_FACTOR = 0.5
+
+# Upper bound in seconds for any single wait, including server-provided ones.
+MAX_RETRY_DELAY = 60
+
+def retry_delay(attempt, retry_after=None):
+    """
+    Computes how long to wait before retrying a failed request.
+
+    Honors the server's Retry-After header when present, otherwise uses
+    exponential backoff with full jitter so concurrent retries spread out.
+
+    Args:
+        attempt (int): The number of the attempt that just failed, starting at 1.
+        retry_after (str): The value of the response's Retry-After header, if any.
+
+    Returns:
+        float: The number of seconds to wait.
+    """
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            # Retry-After may also be an HTTP date.
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return min(max(delay, 0), MAX_RETRY_DELAY)
+
+    return random.uniform(0, min(BACKOFF_FACTOR * 2 ** (attempt - 1), MAX_RETRY_DELAY))
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+import os
+import pandas as pd
+import pyarrow as pa
+import dhl_api
+import fedex_api
+from results_writer import RESULTS_SCHEMA as CARRIER_RESULTS_SCHEMA, track_to_parquet
+
+logger = logging.getLogger(__name__)
+
+# Carrier name -> (coroutine tracking a list of tracking numbers, coroutine closing its client).
+CARRIERS = {
+    "dhl": (dhl_api.track_shipments, dhl_api.close_client),
+    "fedex": (fedex_api.track_shipments, fedex_api.close_client),
+}
+
+# Parquet file main() writes the results to, with the carrier of every shipment.
+RESULTS_PATH = "tracking_results.parquet"
+RESULTS_SCHEMA = CARRIER_RESULTS_SCHEMA.append(pa.field("carrier", pa.dictionary(pa.int8(), pa.string())))
+
+async def track_documents(tracking_documents):
+    """
+    Retrieves the status of the given tracking documents, querying all carriers at once.
+
+    Args:
+        tracking_documents (list[dict]): Documents with a "carrier" and a "tracking_id".
+
+    Returns:
+        pandas.DataFrame: One row per tracked shipment, with the carrier it was tracked with.
+    """
+    # Group the tracking numbers by carrier.
+    jobs = {}
+    for doc in tracking_documents:
+        if doc["carrier"] not in CARRIERS:
+            logger.warning("Unsupported carrier %s for %s.", doc["carrier"], doc["tracking_id"])
+            continue
+        jobs.setdefault(doc["carrier"], []).append(doc["tracking_id"])
+
+    # The lookups are I/O-bound and independent, so run every carrier concurrently.
+    frames = await asyncio.gather(
+        *(CARRIERS[carrier][0](tracking_ids) for carrier, tracking_ids in jobs.items()),
+        return_exceptions=True,
+    )
+
+    results = []
+    for carrier, df in zip(jobs, frames):
+        if isinstance(df, Exception):
+            logger.error("Unexpected error tracking %s shipments: %s", carrier, df)
+            continue
+        results.append(df.assign(carrier=carrier))
+
+    # Create DataFrame
+    return pd.concat(results, ignore_index=True) if results else pd.DataFrame()
+
+async def main():
+    """
+    Main function to process a list of tracking numbers for several carriers
+    from a "document" and check their status, querying all carriers at once.
+    """
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
+
+    # --- Simulating a document with tracking information ---
+    # In a real-world scenario, you would read this data from a file (CSV, Excel),
+    # a database, or another source.
+    tracking_documents = [
+        {"carrier": "dhl", "tracking_id": "8917799995"},
+        {"carrier": "dhl", "tracking_id": "8162797823"},
+        {"carrier": "fedex", "tracking_id": "122816215025810"},
+        {"carrier": "fedex", "tracking_id": "020207021381215"},
+    ]
+
+    # Track the documents in batches, appending each batch's results to disk.
+    try:
+        await track_to_parquet(RESULTS_PATH, tracking_documents, track_documents, schema=RESULTS_SCHEMA)
+    finally:
+        await asyncio.gather(*(close() for _, close in CARRIERS.values()))
+
+    df = pd.read_parquet(RESULTS_PATH)
+    print("\nSummary DataFrame:")
+    print(df)
+
+if __name__ == "__main__":
+    asyncio.run(main())
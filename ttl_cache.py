@@ -0,0 +1,41 @@
+import time
+
+class TTLCache:
+    """
+    Small in-process cache whose entries expire `ttl` seconds after they are stored.
+
+    When the cache is full, the oldest entry is evicted to make room for a new one.
+    """
+
+    def __init__(self, maxsize, ttl):
+        """
+        Args:
+            maxsize (int): The maximum number of entries to keep.
+            ttl (float): The number of seconds an entry stays valid.
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = {}  # key -> (value, monotonic expiry time), oldest first
+
+    def get(self, key, default=None):
+        """
+        Returns the value cached for `key`, or `default` if it is missing or expired.
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        value, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._data[key]
+            return default
+        return value
+
+    def __setitem__(self, key, value):
+        # Re-inserting moves the key to the end, keeping the dict ordered by age.
+        self._data.pop(key, None)
+        if len(self._data) >= self.maxsize:
+            del self._data[next(iter(self._data))]
+        self._data[key] = (value, time.monotonic() + self.ttl)
+
+    def __len__(self):
+        return len(self._data)